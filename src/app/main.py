@@ -22,6 +22,7 @@ from messages import *
 from sleeptools import *
 from datalink import *
 from mapping import *
+from mapsync import *
 from helpfuncs import *
 
 
@@ -167,7 +168,11 @@ class MainWindow(App):
         self._map = None
         self._new_img = False
         self._new_map = False
+        self._map_replica = MapReplica()
+        self._map_key_rate = Rate(1)
         self._colors = load_colors("./files/colors.txt")
+        self._palette = Palette(self._colors)
+        self._map_img = None
 
         return self.window
 
@@ -192,13 +197,16 @@ class MainWindow(App):
             self._link.stop()
         self._link = DataLink("client", False, host=ip, port=port)
         self._link.start()
+        self._map_replica.reset()
 
     def _update_viewer(self, dt):
         if self._new_img:
             self.image_viewer.set_image(self._img)
             self._new_img = False
         if self._new_map:
-            img = map_to_image(self._map, self._colors)
+            if self._map_img is None or self._map_img.shape[:2] != self._map.shape:
+                self._map_img = np.zeros(self._map.shape + (3,), dtype=np.float32)
+            img = map_to_image(self._map, self._palette, out=self._map_img)
             self.map_viewer.set_image(img)
             self._new_map = False
 
@@ -219,6 +227,12 @@ class MainWindow(App):
                 elif msg['type'] == 'map_stream':
                     self._map = msg['data']
                     self._new_map = True
+                elif msg['type'] == KEYFRAME or msg['type'] == PATCH:
+                    if self._map_replica.apply(msg):
+                        self._map = self._map_replica.get_data()
+                        self._new_map = True
+                    elif self._map_key_rate.ready():
+                        self._link.send(cmd_msg('mapkey'))
 
         """ CONSOLE STUFF """
         if self.console_pane.is_open() and not self._con.is_enabled():
@@ -3,6 +3,7 @@ import math
 import cv2
 
 from helpfuncs import *
+from render import Palette, DotRenderer
 
 
 def project(inference, camera_info, cutoff=5):
@@ -48,33 +49,19 @@ def project_global(inference, camera_info, pos, cutoff=5):
 
 
 def draw_inference(image, inference, colors):
-    height, width = image.shape[:2]
-    h_max, w_max = inference.shape
-    h_scale = height / h_max
-    w_scale = width / w_max
-
-    for h in range(h_max):
-        for w in range(w_max):
-            c = int(inference[h, w])
-            if c > 0:
-                color = colors[c]
-                image = cv2.circle(image,
-                    (int((w + 0.5) * w_scale), int((h + 0.5) * h_scale)),
-                    color=color, radius=1, thickness=2)
-    return image
+    renderer = colors if isinstance(colors, DotRenderer) else DotRenderer(colors)
+    return renderer.draw_grid(image, inference)
 
 def draw_projection(image, projections, colors, center=(0.5, 0.75), scale=5):
     height, width = image.shape[:2]
     center = (center[0] * width, center[1] * height)
     scale = height / scale
 
-    for p in projections:
-        color = colors[p['class']]
-        x, y = p['pos']
-        x = x * scale + center[0]
-        y = -y * scale + center[1]
-        image = cv2.circle(image, (int(x), int(y)), color=color, radius=1, thickness=2)
-    return image
+    renderer = colors if isinstance(colors, DotRenderer) else DotRenderer(colors)
+    points = np.array([p['pos'] for p in projections], dtype=np.float64).reshape(-1, 2)
+    classes = np.array([p['class'] for p in projections], dtype=np.int64)
+    points = np.stack([points[:, 0] * scale + center[0], -points[:, 1] * scale + center[1]], axis=1)
+    return renderer.draw_points(image, classes, points)
 
 def draw_distortion(image, camera_info, density=35):
     height, width = image.shape[:2]
@@ -100,13 +87,9 @@ def draw_distortion(image, camera_info, density=35):
                 color=(255, 255, 255), radius=1, thickness=2)
     return image
 
-def map_to_image(map_data, colors):
-    h, w = map_data.shape
-    image = np.zeros((h, w, 3), dtype=np.float32)
-    for y in range(h):
-        for x in range(w):
-            image[y, x] = colors[map_data[y, x]]
-    return image / 255
+def map_to_image(map_data, colors, out=None):
+    palette = colors if isinstance(colors, Palette) else Palette(colors)
+    return palette.colorize(map_data, out=out, normalized=True)
 
 
 class Map:
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+KEYFRAME = 'map_key'
+PATCH = 'map_patch'
+
+
+def pack_tiles(tiles):
+    keys = np.array(list(tiles.keys()), dtype=np.int32).reshape(-1, 2)
+    if len(tiles) == 0:
+        return keys, np.zeros((0, 0, 0), dtype=np.uint8)
+    labels = np.stack([tiles[(int(tx), int(ty))] for tx, ty in keys]).astype(np.uint8)
+    return keys, labels
+
+
+class MapSender:
+    def __init__(self, map):
+        self._map = map
+        self._version = 0
+        self._keyframe = True
+
+    def request_keyframe(self):
+        self._keyframe = True
+
+    def next_message(self):
+        base = self._version
+        if self._keyframe:
+            self._keyframe = False
+            version, tiles = self._map.get_changes()
+            type = KEYFRAME
+        else:
+            version, tiles = self._map.get_changes(base)
+            if len(tiles) == 0:
+                return None
+            type = PATCH
+        keys, labels = pack_tiles(tiles)
+        self._version = version
+        data = {
+            'version': version,
+            'base': base,
+            'scale': self._map.get_scale(),
+            'tile_size': self._map.get_tile_size(),
+            'keys': keys,
+            'labels': labels
+        }
+        return {'type': type, 'data': data}
+
+
+class MapReplica:
+    def __init__(self):
+        self._version = None
+        self._scale = None
+        self._tile_size = None
+        self._tiles = {}
+        self._bounds = None
+
+        self._data = None
+        self._data_bounds = None
+        self._stale = set()
+
+    def reset(self):
+        self.__init__()
+
+    def get_version(self):
+        return self._version
+
+    def get_scale(self):
+        return self._scale
+
+    def apply(self, msg):
+        data = msg['data']
+        if msg['type'] == KEYFRAME:
+            self.reset()
+            self._scale = data['scale']
+            self._tile_size = data['tile_size']
+        elif msg['type'] != PATCH or self._version is None or data['base'] != self._version:
+            return False
+
+        t = self._tile_size
+        for (tx, ty), labels in zip(data['keys'], data['labels']):
+            key = (int(tx), int(ty))
+            self._tiles[key] = labels
+            self._stale.add(key)
+            region = [key[0] * t, key[1] * t, (key[0] + 1) * t, (key[1] + 1) * t]
+            if self._bounds is None:
+                self._bounds = region
+            else:
+                self._bounds = [min(self._bounds[0], region[0]), min(self._bounds[1], region[1]),
+                                max(self._bounds[2], region[2]), max(self._bounds[3], region[3])]
+        self._version = data['version']
+        return True
+
+    def get_data(self):
+        if self._bounds is None:
+            return np.zeros((0, 0), dtype=np.uint8)
+        x_min, y_min, x_max, y_max = self._bounds
+        if self._bounds != self._data_bounds:
+            self._data = np.zeros((y_max - y_min, x_max - x_min), dtype=np.uint8)
+            self._data_bounds = list(self._bounds)
+            self._stale = set(self._tiles.keys())
+        t = self._tile_size
+        for (tx, ty) in self._stale:
+            y = ty * t - y_min
+            x = tx * t - x_min
+            self._data[y:y + t, x:x + t] = self._tiles[(tx, ty)]
+        self._stale.clear()
+        return self._data
+
+    def get_origin(self):
+        if self._bounds is None:
+            return [0, 0]
+        return [-self._bounds[0], -self._bounds[1]]
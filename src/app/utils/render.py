@@ -0,0 +1,80 @@
+import numpy as np
+import cv2
+
+
+class Palette:
+    def __init__(self, colors):
+        self._lut = np.array(colors, dtype=np.uint8).reshape(len(colors), -1)
+        self._lut_norm = self._lut.astype(np.float32) / 255
+
+    def __len__(self):
+        return len(self._lut)
+
+    def get_colors(self, normalized=False):
+        if normalized:
+            return self._lut_norm
+        return self._lut
+
+    def colorize(self, labels, out=None, normalized=False):
+        lut = self._lut_norm if normalized else self._lut
+        return np.take(lut, labels, axis=0, out=out, mode='clip')
+
+
+def dot_stamp(radius=1, thickness=2):
+    size = radius + thickness
+    canvas = np.zeros((2 * size + 1, 2 * size + 1), dtype=np.uint8)
+    canvas = cv2.circle(canvas, (size, size), color=255, radius=radius, thickness=thickness)
+    ys, xs = np.nonzero(canvas)
+    return ys - size, xs - size
+
+
+class DotRenderer:
+    def __init__(self, colors, radius=1, thickness=2, alpha=1):
+        self._palette = colors if isinstance(colors, Palette) else Palette(colors)
+        self._stamp = dot_stamp(radius, thickness)
+        self._alpha = alpha
+        self._layouts = {}
+
+    def draw_grid(self, image, grid, skip=0):
+        ys, xs, cells = self._grid_layout(image.shape, grid.shape)
+        classes = np.take(grid, cells).astype(np.intp, copy=False)
+        if skip is not None:
+            keep = classes != skip
+            ys, xs, classes = ys[keep], xs[keep], classes[keep]
+        return self._blend(image, ys, xs, classes)
+
+    def draw_points(self, image, classes, points):
+        centers = np.asarray(points).astype(np.int64)
+        ys, xs, index = self._stamp_points(image.shape, centers[:, 1], centers[:, 0])
+        classes = np.asarray(classes).astype(np.intp, copy=False)
+        return self._blend(image, ys, xs, classes[index])
+
+    def _grid_layout(self, image_shape, grid_shape):
+        key = (image_shape[:2], grid_shape[:2])
+        layout = self._layouts.get(key)
+        if layout is None:
+            height, width = image_shape[:2]
+            h_max, w_max = grid_shape[:2]
+            cy = ((np.arange(h_max) + 0.5) * (height / h_max)).astype(np.int64)
+            cx = ((np.arange(w_max) + 0.5) * (width / w_max)).astype(np.int64)
+            cy, cx = np.meshgrid(cy, cx, indexing='ij')
+            layout = self._stamp_points(image_shape, cy.ravel(), cx.ravel())
+            self._layouts[key] = layout
+        return layout
+
+    def _stamp_points(self, image_shape, cy, cx):
+        height, width = image_shape[:2]
+        sy, sx = self._stamp
+        ys = (cy[:, None] + sy[None, :]).ravel()
+        xs = (cx[:, None] + sx[None, :]).ravel()
+        index = np.repeat(np.arange(len(cy)), len(sy))
+        inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+        return ys[inside], xs[inside], index[inside]
+
+    def _blend(self, image, ys, xs, classes):
+        colors = self._palette.colorize(classes)[:, :image.shape[2]]
+        if self._alpha >= 1:
+            image[ys, xs] = colors
+        else:
+            image[ys, xs] = image[ys, xs] * (1 - self._alpha) + colors * self._alpha
+        return image
@@ -3,27 +3,17 @@ import math
 import cv2
 import time
 
+from render import DotRenderer
+
 
 class UNETFunctions:
     def __init__(self, class_path, color_path):
         self._classes = load_classes(class_path)
         self._colors = load_colors(color_path)
+        self._renderer = DotRenderer(self._colors)
 
     def draw_dots(self, image, inference):
-        height, width, _ = image.shape
-        h_max, w_max = inference.shape
-        h_scale = height / h_max
-        w_scale = width / w_max
-
-        for h in range(h_max):
-            for w in range(w_max):
-                c = int(inference[h, w])
-                if c > 0:
-                    color = self._colors[c]
-                    image = cv2.circle(image,
-                        (int((w + 0.5) * w_scale), int((h + 0.5) * h_scale)),
-                        color=color, radius=1, thickness=2)
-        return image
+        return self._renderer.draw_grid(image, inference)
 
     def find_border(self, inference, c_type):
         idx = self._classes.index(c_type)
@@ -8,6 +8,7 @@ warnings.filterwarnings("ignore")
 
 from dataset import ImageDim, DataLoader, TrainingDataset, ImageDataset
 from model import GNetModel
+from render import Palette
 
 
 class GNet:
@@ -24,6 +25,7 @@ class GNet:
 
         self._classes = load_classes(class_path)
         self._colors = load_colors(color_path)
+        self._palette = Palette(self._colors)
 
         assert self._classes != []
         assert self._colors != []
@@ -137,10 +139,11 @@ class GNet:
             }
             save_checkpoint(checkpoint, filename=saveas)
 
-    def toONNX(self, filename):
+    def toONNX(self, filename, dynamic_batch=False):
         x = torch.ones(self._img_dims.get_BCHW()).to(self._device)
+        dynamic_axes = {'input': {0: 'batch'}, 'output': {0: 'batch'}} if dynamic_batch else None
         torch.onnx.export(self._model, x, filename, input_names=['input'],
-            output_names=['output'], export_params=True)
+            output_names=['output'], export_params=True, dynamic_axes=dynamic_axes)
 
     def predict_folder(self, image_folder):
         ds = ImageDataset(image_folder, self._img_dims)
@@ -161,12 +164,8 @@ class GNet:
                 preds = np.argmax(preds, axis=3)
 
                 for i in range(len(device_tensors)):
-                    height, width = preds[i].shape
-                    arr = np.zeros((height, width, self._img_dims.get_channels()))
-                    for y in range(height):
-                        for x in range(width):
-                            arr[y, x] = self._colors[preds[i, y, x]]
-                    mask = cv2.cvtColor(arr.astype(np.float32) / 255, cv2.COLOR_RGB2BGR)
+                    arr = self._palette.colorize(preds[i], normalized=True)
+                    mask = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
                     mask = cv2.resize(mask, self._img_dims.get_WH(), interpolation=cv2.INTER_NEAREST)
 
                     image = np.transpose(tensors[i].numpy().astype(np.float32), (1, 2, 0))
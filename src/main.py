@@ -9,14 +9,22 @@ sys.path.insert(1, './utils')
 from sleeptools import *
 from datalink import *
 from camera import *
-from gnetTRT import *
+from inference import *
 from mapping import *
+from mapsync import *
 from robotcontroller import *
 from helpfuncs import *
+from planner import *
+from pursuit import *
+from observations import *
+from safety import *
 
 image_params = {'width': 480, 'height': 360, 'channels': 3}
 encode_param = [cv2.IMWRITE_JPEG_QUALITY, 100]
 model_path = './files/gnet.onnx'
+backend = 'trt'
+lut_path = './files/projection_lut.npz'
+map_path = './map'
 class_path = './files/classes.txt'
 color_path = './files/colors.txt'
 classes = load_classes(class_path)
@@ -31,15 +39,18 @@ def main():
     camera = Camera(image_params['width'], image_params['height'])
     rc = RobotController('/dev/ttyACM0', 115200)
     img_saver = ImageSaver(saved_images, clean=True)
-    pipe = InferencePipeline(camera, model_path)
+    pipe = InferencePipeline(camera, model_path, backend=backend)
 
     camera_info = camera.get_info()
+    lut = ProjectionLUT(camera_info, pipe.get_inf_dims(), path=lut_path)
+    safety = SafetyGate(lut, classes)
 
     status = {
         'power': True,
         'running': True,
         'sleeping': False,
         'rc': False,
+        'auto': False,
         'img_logging': False
     }
     rc_data = {'forward': 0, 'steer': 0}
@@ -51,8 +62,14 @@ def main():
     stream_fps = Rate(15)
     img_save_rate = Rate(0.75)
     map_send_rate = Rate(2)
-    map = Map(len(classes), size=5, scale=0.5)
+    map = TiledMap(len(classes), size=5, scale=0.5, fusion=LogOddsFusion(), path=map_path)
+    map_sender = MapSender(map)
+    coverage = CoverageTracker(map)
+    coverage_planner = CoveragePlanner(map, mow_class=classes.index('grass'))
+    follower = PurePursuit(rc, mow_power=1)
+    observations = ObservationStore()
     projections = None
+    connected = False
 
     link.start()
     camera.start()
@@ -74,38 +91,36 @@ def main():
                     elif cmd == 'stop':
                         status['rc'] = False
                         status['img_logging'] = False
+                        follower.stop()
+                    elif cmd == 'mow':
+                        status['rc'] = False
+                        follower.set_path(coverage_planner.plan(rc.pos))
+                        follower.start()
+                    elif cmd == 'mapkey':
+                        map_sender.request_keyframe()
                 elif type == 'rc':
+                    follower.stop()
                     status['rc'] = True
                     rc_data = msg['data']
                     last_rc = time.perf_counter()
 
+            if connected != (link.latency() != float('inf')):
+                connected = not connected
+                if connected:
+                    map_sender.request_keyframe()
+
             if status['rc']:
                 if time.perf_counter() - last_rc > rc_timeout:
                     rc.set_motor_speed(0, 0, 0)
                     status['rc'] = False
                 else:
-                    left_pow = rc_data['forward'] + rc_data['steer']
-                    right_pow = rc_data['forward'] - rc_data['steer']
-                    abs_left = abs(left_pow)
-                    abs_right = abs(right_pow)
-                    if abs_left > abs_right:
-                        if abs_left > 1:
-                            right_pow *= 1 / abs_left
-                            if left_pow > 0:
-                                left_pow = 1
-                            else:
-                                left_pow = right_pow
-                                right_pow = -1
-                    else:
-                        if abs_right > 1:
-                            left_pow *= 1 / abs_right
-                            if right_pow > 0:
-                                right_pow = 1
-                            else:
-                                right_pow = left_pow
-                                left_pow = -1
+                    left_pow, right_pow = differential_power(rc_data['forward'], rc_data['steer'])
                     rc.set_motor_speed(left_pow, right_pow, 0)
 
+            rc.set_motor_limit(safety.get_limit())
+            mow_power = rc.get_motors().mow_power if rc.get_motor_limit() != 0 else 0
+            coverage.update(rc.pos, mow_power)
+
             isnew, image = camera.capture()
             if isnew:
                 if stream_fps.ready():
@@ -119,15 +134,22 @@ def main():
 
             isnew, inference = pipe.get_inference()
             if isnew:
-                projections = project_global(inference, camera_info, rc.pos)
-                map.map_projections(projections)
+                rc.set_motor_limit(safety.check(inference))
+                projections = to_global(lut.project(inference), rc.pos)
+                map.map_projections(projections, weights=lut.get_weights())
+                observations.add(projections, weights=lut.get_weights())
                 if map_send_rate.ready():
                     '''image = map_to_image(map.get_data(), colors, image_params['width'])
                     _, out = cv2.imencode('.jpg', image, encode_param)
                     msg = {'type': 'image_stream', 'data': out}
                     link.send(msg)'''
-                    msg = {'type': 'map_stream', 'data': map.get_data()}
-                    link.send(msg)
+                    msg = map_sender.next_message()
+                    if msg is not None:
+                        link.send(msg)
+
+            if follower.is_running() and follower.is_done():
+                follower.stop()
+            status['auto'] = follower.is_running()
 
             if status_rate.ready():
                 msg = {'type': 'status', 'data': status}
@@ -138,7 +160,9 @@ def main():
         exc_type, exc_obj, exc_tb = sys.exc_info()
         fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
         print(exc_type, exc_obj, exc_tb)
+    map.close()
     pipe.stop()
+    follower.stop()
     rc.stop()
     link.stop()
     camera.close()
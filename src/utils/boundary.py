@@ -0,0 +1,92 @@
+import numpy as np
+import cv2
+
+
+def overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class Boundary:
+    def __init__(self, cells, bbox, points, hole, area):
+        self.cells = cells
+        self.bbox = bbox
+        self.points = points
+        self.hole = hole
+        self.area = area
+
+
+class BoundaryTracker:
+    def __init__(self, map, lawn_class=1, epsilon=0.25, min_area=4):
+        self._map = map
+        self._lawn_class = lawn_class
+        self._epsilon = epsilon / map.get_scale()
+        self._min_area = min_area
+
+        self._version = None
+        self._bounds = None
+        self._boundaries = []
+
+    def get_boundaries(self):
+        return [b for b in self._boundaries if b.area >= self._min_area]
+
+    def get_polygons(self, holes=True):
+        return [b.points for b in self.get_boundaries() if holes or not b.hole]
+
+    def update(self):
+        version, tiles = self._map.get_changes(self._version)
+        self._version = version
+        bounds = self._map.get_bounds()
+        if bounds is None:
+            self._boundaries = []
+            return False
+        if bounds != self._bounds:
+            self._bounds = bounds
+            self._boundaries = self._extract(self._map.get_data(), bounds, bounds)
+            return True
+        if len(tiles) == 0:
+            return False
+
+        t = self._map.get_tile_size()
+        window = None
+        for (tx, ty) in tiles.keys():
+            region = [tx * t - 1, ty * t - 1, tx * t + t, ty * t + t]
+            if window is None:
+                window = region
+            else:
+                window = [min(window[0], region[0]), min(window[1], region[1]),
+                          max(window[2], region[2]), max(window[3], region[3])]
+
+        keep = self._boundaries
+        while True:
+            inside = [b for b in keep if overlaps(b.bbox, window)]
+            if len(inside) == 0:
+                break
+            keep = [b for b in keep if not overlaps(b.bbox, window)]
+            for b in inside:
+                window = [min(window[0], b.bbox[0]), min(window[1], b.bbox[1]),
+                          max(window[2], b.bbox[2]), max(window[3], b.bbox[3])]
+
+        window = [max(window[0], bounds[0]), max(window[1], bounds[1]),
+                  min(window[2] + 1, bounds[2]), min(window[3] + 1, bounds[3])]
+        self._boundaries = keep + self._extract(self._map.get_data(), bounds, window)
+        return True
+
+    def _extract(self, labels, bounds, window):
+        x0, y0, x1, y1 = window
+        mask = labels[y0 - bounds[1]:y1 - bounds[1], x0 - bounds[0]:x1 - bounds[0]] == self._lawn_class
+        mask = np.pad(mask.astype(np.uint8), 1)
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+        if hierarchy is None:
+            return []
+
+        scale = self._map.get_scale()
+        boundaries = []
+        for contour, info in zip(contours, hierarchy[0]):
+            cells = contour.reshape(-1, 2) + (x0 - 1, y0 - 1)
+            simple = cv2.approxPolyDP(contour, self._epsilon, True).reshape(-1, 2) + (x0 - 1, y0 - 1)
+            points = simple * scale
+            points[:, 1] *= -1
+            (bx0, by0), (bx1, by1) = cells.min(axis=0), cells.max(axis=0)
+            boundaries.append(Boundary(cells, (int(bx0), int(by0), int(bx1), int(by1)), points,
+                                       info[3] != -1, cv2.contourArea(contour)))
+        return boundaries
@@ -3,6 +3,7 @@ import threading
 import cv2
 import os
 import math
+import numpy as np
 
 from utils.sleeptools import Rate
 from utils.imagebuffer import ImageBuffer
@@ -73,11 +74,8 @@ class Camera:
         b = -0.204189
         c = 1.6014
         d = 0
-        y = a * pow(x, 3) + b * pow(x, 2) + c * x + d
-        if y < 0:
-            y = 0
-        elif y > 1:
-            y = 1
+        y = a * np.power(x, 3) + b * np.power(x, 2) + c * x + d
+        y = np.clip(y, 0, 1)
         return x
 
     def start(self):
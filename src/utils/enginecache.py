@@ -0,0 +1,65 @@
+import hashlib
+import json
+import glob
+import os
+
+
+def model_hash(model_path, backend, options=None):
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as model:
+        for chunk in iter(lambda: model.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(backend.encode('utf-8'))
+    digest.update(json.dumps(options or {}, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class EngineCache:
+    def __init__(self, model_path, backend, options=None, suffix='.engine'):
+        self._key = model_hash(model_path, backend, options)
+        self._prefix = f"{os.path.splitext(model_path)[0]}.{backend}."
+        self._suffix = suffix
+        self._path = f"{self._prefix}{self._key}{suffix}"
+
+    def get_key(self):
+        return self._key
+
+    def get_path(self):
+        return self._path
+
+    def exists(self):
+        return os.path.isfile(self._path)
+
+    def load(self):
+        if not self.exists():
+            return None
+        try:
+            with open(self._path, 'rb') as file:
+                return file.read()
+        except OSError as e:
+            return None
+
+    def save(self, data):
+        tmp = f"{self._path}.tmp"
+        try:
+            with open(tmp, 'wb') as file:
+                file.write(data)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            return False
+        self.prune()
+        return True
+
+    def remove(self):
+        try:
+            os.remove(self._path)
+        except OSError as e:
+            pass
+
+    def prune(self):
+        for path in glob.glob(f"{glob.escape(self._prefix)}*{self._suffix}"):
+            if path != self._path:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    pass
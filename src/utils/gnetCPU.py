@@ -0,0 +1,163 @@
+import numpy as np
+import time
+import platform
+import cv2
+
+from enginecache import EngineCache
+from inference import ImagePreprocessor
+
+try:
+    import onnxruntime as ort
+except ImportError as e:
+    ort = None
+
+
+class GNetCPU:
+    def __init__(self, verbose=False, threads=2, engine='auto', mean=None, std=None, cache=True):
+        self._verbose = verbose
+        self._cache = cache
+        self._threads = threads
+        self._engine_type = engine
+
+        self._width = 320
+        self._height = 240
+        self._classes = 4
+
+        self._out_width = 17
+        self._out_height = 13
+
+        self._engine = None
+        self._binding = None
+        self._batched = False
+        self._in_cpu = None
+        self._out_cpu = None
+        self._input = None
+        self._preprocessor = ImagePreprocessor(self._width, self._height, mean, std)
+
+    def open(self, device=0):
+        cv2.setNumThreads(self._threads)
+
+    def close(self):
+        self._engine = None
+        self._binding = None
+
+    def build_engine(self, model_path):
+        engine = self._engine_type
+        if engine == 'auto':
+            engine = 'ort' if ort is not None else 'dnn'
+        if self._verbose:
+            self._print(f"Loading \"{model_path}\" with {engine}")
+
+        self._in_cpu = np.zeros((1, 3, self._height, self._width), dtype=np.float32)
+        self._out_cpu = np.zeros((1, self._classes, self._out_height, self._out_width), dtype=np.float32)
+        self._input = self._in_cpu[0]
+        if engine == 'ort':
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self._threads
+            options.inter_op_num_threads = 1
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            self._engine = self._load_session(model_path, options)
+            self._batched = not isinstance(self._engine.get_inputs()[0].shape[0], int)
+            self._binding = self._engine.io_binding()
+            self._binding.bind_input(self._engine.get_inputs()[0].name, 'cpu', 0, np.float32,
+                                     self._in_cpu.shape, self._in_cpu.ctypes.data)
+            self._binding.bind_output(self._engine.get_outputs()[0].name, 'cpu', 0, np.float32,
+                                      self._out_cpu.shape, self._out_cpu.ctypes.data)
+        elif engine == 'dnn':
+            self._engine = cv2.dnn.readNetFromONNX(model_path)
+            self._engine.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self._engine.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        else:
+            raise ValueError(f"Unknown engine \"{engine}\"")
+        self._engine_type = engine
+        if self._verbose:
+            self._print("Engine is built")
+
+    def _load_session(self, model_path, options):
+        providers = ['CPUExecutionProvider']
+        if not self._cache:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            return ort.InferenceSession(model_path, options, providers=providers)
+
+        options_key = {'onnxruntime': ort.__version__, 'machine': platform.machine()}
+        cache = EngineCache(model_path, 'ort', options_key, suffix='.onnx')
+        if cache.exists():
+            if self._verbose:
+                self._print(f"Loading optimized graph from \"{cache.get_path()}\"")
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            try:
+                return ort.InferenceSession(cache.get_path(), options, providers=providers)
+            except Exception as e:
+                cache.remove()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.optimized_model_filepath = cache.get_path()
+        session = ort.InferenceSession(model_path, options, providers=providers)
+        cache.prune()
+        return session
+
+    def create_context(self):
+        return None
+
+    def get_preprocessor(self):
+        return self._preprocessor
+
+    def prepare_image(self, img, out=None):
+        return self._preprocessor.prepare(img, self._input if out is None else out)
+
+    def inference(self, inputs, context=None):
+        if inputs is not self._input:
+            self._in_cpu[0] = inputs
+        if self._engine_type == 'ort':
+            self._engine.run_with_iobinding(self._binding)
+        else:
+            self._engine.setInput(self._in_cpu)
+            self._out_cpu[:] = self._engine.forward()
+        result = self._out_cpu[0]
+        result = np.argmax(np.transpose(result, (1, 2, 0)), axis=2)
+        return result
+
+    def inference_batch(self, inputs, context=None):
+        if not self._batched or len(inputs) == 1:
+            return np.stack([self.inference(img, context) for img in inputs])
+        output = self._engine.run(None, {self._engine.get_inputs()[0].name: inputs})[0]
+        return np.argmax(output, axis=1)
+
+    def input_dims(self):
+        return (3, self._height, self._width)
+
+    def output_dims(self):
+        return (self._out_height, self._out_width)
+
+    def _print(self, msg):
+        print(f"[GNET] {msg}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else '../files/gnet.onnx'
+    frames = 200
+    img = np.random.randint(0, 256, (360, 480, 3), dtype=np.uint8)
+
+    for engine in ('ort', 'dnn'):
+        if engine == 'ort' and ort is None:
+            continue
+        model = GNetCPU(verbose=True, engine=engine)
+        model.open()
+        model.build_engine(model_path)
+        context = model.create_context()
+        model.inference(model.prepare_image(img), context)
+
+        prepare = 0
+        infer = 0
+        for _ in range(frames):
+            start = time.perf_counter()
+            inputs = model.prepare_image(img)
+            mid = time.perf_counter()
+            model.inference(inputs, context)
+            prepare += mid - start
+            infer += time.perf_counter() - mid
+        model.close()
+        total = prepare + infer
+        print(f"{engine}: prepare {prepare / frames * 1000:.2f} ms, "
+              f"inference {infer / frames * 1000:.2f} ms, {frames / total:.1f} fps")
@@ -9,6 +9,30 @@ def hypotenuse(b1, b2):
     return math.sqrt(pow(b1, 2) + pow(b2, 2))
 
 
+def differential_power(forward, steer):
+    left_pow = forward + steer
+    right_pow = forward - steer
+    abs_left = abs(left_pow)
+    abs_right = abs(right_pow)
+    if abs_left > abs_right:
+        if abs_left > 1:
+            right_pow *= 1 / abs_left
+            if left_pow > 0:
+                left_pow = 1
+            else:
+                left_pow = right_pow
+                right_pow = -1
+    else:
+        if abs_right > 1:
+            left_pow *= 1 / abs_right
+            if right_pow > 0:
+                right_pow = 1
+            else:
+                right_pow = left_pow
+                left_pow = -1
+    return left_pow, right_pow
+
+
 def load_classes(path):
     classes = []
     file = open(path, 'r')
@@ -0,0 +1,221 @@
+import numpy as np
+import time
+import threading
+import multiprocessing as mp
+import queue
+import importlib
+import cv2
+
+from imagebuffer import ImageBuffer
+from sharedring import SharedRing
+from sleeptools import Rate
+
+
+BACKENDS = {
+    'trt': ('gnetTRT', 'GNetTRT'),
+    'cpu': ('gnetCPU', 'GNetCPU')
+}
+
+
+def load_backend(name, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend \"{name}\"")
+    module, cls = BACKENDS[name]
+    return getattr(importlib.import_module(module), cls)(**options)
+
+
+class ImagePreprocessor:
+    def __init__(self, width, height, mean=None, std=None):
+        self._width = width
+        self._height = height
+        self._buffer = None
+        self.set_normalization(mean, std)
+
+    def set_normalization(self, mean=None, std=None):
+        mean = np.zeros(3) if mean is None else np.asarray(mean, dtype=np.float64)
+        std = np.ones(3) if std is None else np.asarray(std, dtype=np.float64)
+        self._scale = (1 / (255 * std)).astype(np.float32)
+        self._bias = (-mean / std).astype(np.float32)
+
+    def prepare(self, img, out=None):
+        img = cv2.resize(img, (self._width, self._height), interpolation=cv2.INTER_NEAREST)
+        if out is None:
+            if self._buffer is None:
+                self._buffer = np.empty((3, self._height, self._width), dtype=np.float32)
+            out = self._buffer
+        for c in range(3):
+            np.multiply(img[:, :, 2 - c], self._scale[c], out=out[c], casting='unsafe')
+            if self._bias[c] != 0:
+                out[c] += self._bias[c]
+        return out
+
+
+class InferenceScheduler:
+    def __init__(self, model_path, fps=30, backend='trt', max_batch=4, deadline=0.01, **options):
+        self._model_path = model_path
+        self._fps = fps
+        self._max_batch = max_batch
+        self._deadline = deadline
+
+        self._model = load_backend(backend, verbose=True, **options)
+        self._inf_dims = self._model.output_dims()
+
+        self._streams = []
+
+        self._inf_thread = None
+        self._stop = threading.Event()
+        self._stop.set()
+
+    def add_stream(self, camera, stream=None):
+        if not self._stop.is_set():
+            raise RuntimeError("Streams must be added before the scheduler is started")
+        if stream is None:
+            stream = camera.new_stream()
+        info = camera.get_info()
+        self._streams.append({
+            'camera': camera,
+            'stream': stream,
+            'shape': (info['height'], info['width'], 3),
+            'buffer': ImageBuffer(self._inf_dims[0], self._inf_dims[1])
+        })
+        return len(self._streams) - 1
+
+    def start(self):
+        if self._stop.is_set():
+            self._stop.clear()
+            self._inf_thread = threading.Thread(target=self._update)
+            self._inf_thread.start()
+
+    def stop(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._inf_thread.join()
+
+    def get_inference(self, stream=0):
+        return self._streams[stream]['buffer'].get_latest()
+
+    def get_inf_dims(self):
+        return self._inf_dims
+
+    def _update(self):
+        frames = [SharedRing(4, s['shape'], np.uint8) for s in self._streams]
+        results = [SharedRing(4, self._inf_dims, np.uint8) for s in self._streams]
+        img_q = mp.Queue()
+        inf_q = mp.Queue()
+        producer = Inferencer(0, self._model, self._model_path, self._fps, img_q, inf_q,
+                              frames, results, self._max_batch)
+        producer.start()
+        rate = Rate(self._fps * 2)
+        seq = 0
+        last_seq = [-1] * len(self._streams)
+        batch = {}
+        batch_start = None
+
+        while not self._stop.is_set():
+            if producer.request_img.is_set():
+                for i, s in enumerate(self._streams):
+                    if i in batch or len(batch) >= self._max_batch:
+                        continue
+                    isnew, frame = s['camera'].capture(stream=s['stream'])
+                    if isnew:
+                        batch[i] = frames[i].write(frame)
+                        if batch_start is None:
+                            batch_start = time.perf_counter()
+                full = len(batch) >= min(self._max_batch, len(self._streams))
+                if len(batch) != 0 and (full or time.perf_counter() - batch_start >= self._deadline):
+                    try:
+                        img_q.put_nowait([(i, slot, seq) for i, slot in batch.items()])
+                        producer.request_img.clear()
+                        seq += 1
+                        batch = {}
+                        batch_start = None
+                    except queue.Full as e:
+                        pass
+            try:
+                for i, slot, res_seq in inf_q.get_nowait():
+                    if res_seq > last_seq[i]:
+                        last_seq[i] = res_seq
+                        self._streams[i]['buffer'].insert(results[i].get(slot))
+            except queue.Empty as e:
+                pass
+            rate.sleep()
+
+        try:
+            while True:
+                img_q.get_nowait()
+        except queue.Empty as e:
+            pass
+
+        producer.stop.set()
+        producer.join()
+        for ring in frames + results:
+            ring.close()
+
+
+class InferencePipeline(InferenceScheduler):
+    def __init__(self, camera, model_path, fps=30, backend='trt', **options):
+        InferenceScheduler.__init__(self, model_path, fps, backend, max_batch=1, **options)
+        self._stream = self.add_stream(camera)
+
+
+class Inferencer(mp.Process):
+    def __init__(self, gpuID, model, model_path, fps, img_q, inf_q, frames, results, max_batch=1, timeout=5):
+        mp.Process.__init__(self)
+
+        self._gpuID = gpuID
+        self._model = model
+        self._model_path = model_path
+        self._fps = fps
+        self._img_q = img_q
+        self._inf_q = inf_q
+        self._frames = frames
+        self._results = results
+        self._max_batch = max_batch
+        self._timeout = timeout
+
+        self.request_img = mp.Event()
+        self.stop = mp.Event()
+
+    def run(self):
+        self._model.open(self._gpuID)
+        self._model.build_engine(self._model_path)
+        exe_ctx = self._model.create_context()
+        inputs = np.empty((self._max_batch,) + self._model.input_dims(), dtype=np.float32)
+
+        last = time.perf_counter()
+
+        rate = Rate(self._fps)
+        while not self.stop.is_set():
+            try:
+                batch = self._img_q.get_nowait()
+                last = time.perf_counter()
+                new_img = True
+            except queue.Empty as e:
+                self.request_img.set()
+                new_img = False
+                if time.perf_counter() - last >= self._timeout:
+                    self.stop.set()
+            if new_img:
+                if len(batch) == 1:
+                    stream, slot, seq = batch[0]
+                    img = self._model.prepare_image(self._frames[stream].get(slot))
+                    outputs = [self._model.inference(img, exe_ctx)]
+                else:
+                    for i, (stream, slot, seq) in enumerate(batch):
+                        self._model.prepare_image(self._frames[stream].get(slot), out=inputs[i])
+                    outputs = self._model.inference_batch(inputs[:len(batch)], exe_ctx)
+                done = []
+                for (stream, slot, seq), output in zip(batch, outputs):
+                    done.append((stream, self._results[stream].write(output), seq))
+                try:
+                    self._inf_q.put_nowait(done)
+                except queue.Full as e:
+                    pass
+            rate.sleep()
+
+        try:
+            while True:
+                self._inf_q.get_nowait()
+        except queue.Empty as e:
+            pass
+        self._model.close()
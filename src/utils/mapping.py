@@ -1,81 +1,182 @@
 import numpy as np
 import math
 import cv2
+import os
+import re
+import json
+import time
 
 from helpfuncs import *
+from render import Palette, DotRenderer
 
 
-def project(inference, camera_info, cutoff=5):
-    height, width = inference.shape[:2]
+def project_cells(shape, camera_info, cutoff=5):
+    height, width = shape[:2]
     center = [(width - 1) / 2, (height - 1) / 2]
     c_dist = distance([0, 0], center)
     r_fov = camera_info['fov'] / 2
 
-    projections = []
-    for y in range(height):
-        for x in range(width):
-            y_diff = center[1] - y
-            x_diff =  x - center[0]
-            dist = distance([0, 0], [x_diff, y_diff])
-            if dist != 0:
-                scale = dist / c_dist
-                new_scale = camera_info['distortion_fn'](scale) / scale
-                v_angle = (y_diff * new_scale / c_dist) * r_fov + camera_info['cam_angle']
-                h_angle = (x_diff * new_scale / c_dist) * r_fov
-            else:
-                v_angle = camera_info['cam_angle']
-                h_angle = 0
-            if v_angle >= 0:
-                continue
-            p_y = math.tan(math.radians(90 + v_angle)) * camera_info['cam_height']
-            hyp = hypotenuse(p_y, camera_info['cam_height'])
-            p_x = math.tan(math.radians(h_angle)) * hyp
-            if distance([0, 0], [p_x, p_y]) > cutoff:
-                continue
-            projections.append({'class': int(inference[y, x]), 'pos': (p_x, p_y)})
-    return projections
+    y_diff = center[1] - np.arange(height, dtype=np.float64)[:, None]
+    x_diff = np.arange(width, dtype=np.float64)[None, :] - center[0]
+    y_diff, x_diff = np.broadcast_arrays(y_diff, x_diff)
+    dist = np.hypot(x_diff, y_diff)
+    scale = np.where(dist != 0, dist / c_dist, 1)
+    new_scale = np.asarray(camera_info['distortion_fn'](scale), dtype=np.float64) / scale
+    v_angle = (y_diff * new_scale / c_dist) * r_fov + camera_info['cam_angle']
+    h_angle = (x_diff * new_scale / c_dist) * r_fov
+
+    valid = v_angle < 0
+    with np.errstate(invalid='ignore', over='ignore'):
+        p_y = np.tan(np.radians(90 + v_angle)) * camera_info['cam_height']
+        hyp = np.hypot(p_y, camera_info['cam_height'])
+        p_x = np.tan(np.radians(h_angle)) * hyp
+        valid &= np.hypot(p_x, p_y) <= cutoff
+    return np.stack([p_x, p_y], axis=2), valid
+
+
+def project(inference, camera_info, cutoff=5):
+    points, valid = project_cells(inference.shape, camera_info, cutoff)
+    return inference[valid].astype(np.int64), points[valid]
+
+
+def projection_weights(points):
+    return np.exp(-np.hypot(points[:, 0], points[:, 1])).astype(np.float32)
 
 
 def project_global(inference, camera_info, pos, cutoff=5):
-    projections = project(inference, camera_info, cutoff)
-    angle = math.radians(pos.heading.get())
-    for projection in projections:
-        (x, y) = projection['pos']
-        xx = x * math.cos(angle) + y * math.sin(angle) + pos.x
-        yy = -x * math.sin(angle) + y * math.cos(angle) + pos.y
-        projection['pos'] = (xx, yy)
-        #print(xx, yy, pos.heading.get())
-    return projections
+    return to_global(project(inference, camera_info, cutoff), pos)
+
+
+def to_global(projections, pos):
+    classes, points = projections
+    return classes, transform_points(points, pos)
+
+
+def to_global_frames(frames, poses):
+    classes = np.concatenate([f[0] for f in frames])
+    points = np.concatenate([f[1] for f in frames])
+    index = np.repeat(np.arange(len(frames)), [len(f[0]) for f in frames])
+    return classes, transform_points(points, poses, index)
+
+
+def pose_array(poses):
+    if isinstance(poses, np.ndarray):
+        return poses.astype(np.float64, copy=False).reshape(-1, 3)
+    if hasattr(poses, 'heading'):
+        poses = [poses]
+    rows = [(p.x, p.y, p.heading.get()) if hasattr(p, 'heading') else p for p in poses]
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def transform_points(points, poses, index=None):
+    poses = pose_array(poses)
+    angle = np.radians(poses[:, 2])
+    c = np.cos(angle)
+    s = np.sin(angle)
+    rot = np.stack([np.stack([c, -s], axis=1), np.stack([s, c], axis=1)], axis=1)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if index is None:
+        return points @ rot[0] + poses[0, :2]
+    return np.einsum('ni,nij->nj', points, rot[index]) + poses[index, :2]
+
+
+class ProjectionLUT:
+    KEY_SAMPLES = 16
+
+    def __init__(self, camera_info, dims, cutoff=5, path=None):
+        self._dims = tuple(dims[:2])
+        self._cutoff = cutoff
+        self._path = path
+
+        self._key = None
+        self._offsets = None
+        self._valid = None
+        self._index = None
+        self._points = None
+        self._weights = None
+
+        if path is None or not self._load(camera_info):
+            self.update(camera_info)
+
+    def update(self, camera_info):
+        key = self._make_key(camera_info)
+        if self._key is not None and np.array_equal(key, self._key):
+            return False
+        offsets, valid = project_cells(self._dims, camera_info, self._cutoff)
+        self._set(key, offsets, valid)
+        if self._path is not None:
+            self.save(self._path)
+        return True
+
+    def project(self, inference):
+        return np.take(inference, self._index).astype(np.int64), self._points
+
+    def get_dims(self):
+        return self._dims
+
+    def get_offsets(self):
+        return self._offsets
+
+    def get_valid(self):
+        return self._valid
+
+    def get_weights(self):
+        return self._weights
+
+    def get_zone(self, width, depth, min_depth=0):
+        x = self._offsets[..., 0]
+        y = self._offsets[..., 1]
+        return self._valid & (np.abs(x) <= width / 2) & (y >= min_depth) & (y <= depth)
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as file:
+            np.savez(file, key=self._key, offsets=self._offsets, valid=self._valid)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _load(self, camera_info):
+        if not os.path.isfile(self._path):
+            return False
+        key = self._make_key(camera_info)
+        try:
+            with np.load(self._path) as data:
+                if not np.array_equal(data['key'], key):
+                    return False
+                self._set(key, data['offsets'], data['valid'])
+        except Exception as e:
+            return False
+        return True
+
+    def _set(self, key, offsets, valid):
+        self._key = key
+        self._offsets = np.asarray(offsets, dtype=np.float32)
+        self._valid = np.asarray(valid, dtype=bool)
+        self._index = np.flatnonzero(self._valid)
+        self._points = self._offsets.reshape(-1, 2)[self._index]
+        self._weights = projection_weights(self._points)
+
+    def _make_key(self, camera_info):
+        samples = np.linspace(0, 1, self.KEY_SAMPLES)
+        distortion = np.asarray(camera_info['distortion_fn'](samples), dtype=np.float64)
+        params = [self._dims[0], self._dims[1], self._cutoff,
+            camera_info['fov'], camera_info['cam_angle'], camera_info['cam_height']]
+        return np.concatenate([np.asarray(params, dtype=np.float64), distortion])
 
 
 def draw_inference(image, inference, colors):
-    height, width = image.shape[:2]
-    h_max, w_max = inference.shape
-    h_scale = height / h_max
-    w_scale = width / w_max
-
-    for h in range(h_max):
-        for w in range(w_max):
-            c = int(inference[h, w])
-            if c > 0:
-                color = colors[c]
-                image = cv2.circle(image,
-                    (int((w + 0.5) * w_scale), int((h + 0.5) * h_scale)),
-                    color=color, radius=1, thickness=2)
-    return image
+    renderer = colors if isinstance(colors, DotRenderer) else DotRenderer(colors)
+    return renderer.draw_grid(image, inference)
 
 def draw_projection(image, projections, colors, center=(0.5, 0.75), scale=5):
     height, width = image.shape[:2]
     center = (center[0] * width, center[1] * height)
     scale = height / scale
 
-    for p in projections:
-        color = colors[p['class']]
-        x, y = p['pos']
-        x = x * scale + center[0]
-        y = -y * scale + center[1]
-        image = cv2.circle(image, (int(x), int(y)), color=color, radius=1, thickness=2)
-    return image
+    classes, points = projections
+    renderer = colors if isinstance(colors, DotRenderer) else DotRenderer(colors)
+    points = np.stack([points[:, 0] * scale + center[0], -points[:, 1] * scale + center[1]], axis=1)
+    return renderer.draw_points(image, classes, points)
 
 def draw_distortion(image, camera_info, density=35):
     height, width = image.shape[:2]
@@ -101,13 +202,112 @@ def draw_distortion(image, camera_info, density=35):
                 color=(255, 255, 255), radius=1, thickness=2)
     return image
 
-def map_to_image(map_data, colors):
-    h, w = map_data.shape
-    image = np.zeros((h, w, 3), dtype=np.float32)
-    for y in range(h):
-        for x in range(w):
-            image[y, x] = colors[map_data[y, x]]
-    return image / 255
+def map_cells(points, scale):
+    cells = np.rint(np.asarray(points, dtype=np.float64) / scale).astype(np.int64)
+    cells[:, 1] *= -1
+    return cells
+
+
+def fill_convex(polygon):
+    if len(polygon) < 3:
+        return np.zeros((0, 2), dtype=np.int64)
+    x_min, y_min = np.ceil(polygon.min(axis=0)).astype(np.int64)
+    x_max, y_max = np.floor(polygon.max(axis=0)).astype(np.int64)
+    if x_max < x_min or y_max < y_min:
+        return np.zeros((0, 2), dtype=np.int64)
+    ys, xs = np.mgrid[y_min:y_max + 1, x_min:x_max + 1]
+    cells = np.stack([xs.ravel(), ys.ravel()], axis=1)
+    start = polygon
+    edge = np.roll(polygon, -1, axis=0) - polygon
+    cross = edge[:, None, 0] * (cells[None, :, 1] - start[:, None, 1]) - \
+        edge[:, None, 1] * (cells[None, :, 0] - start[:, None, 0])
+    inside = np.all(cross >= 0, axis=0) | np.all(cross <= 0, axis=0)
+    return cells[inside]
+
+
+class CoverageTracker:
+    def __init__(self, map, deck_width=0.5, deck_length=0.3, deck_offset=0):
+        self._map = map
+        half_w = deck_width / 2
+        half_l = deck_length / 2
+        self._deck = np.array([
+            [-half_w, deck_offset - half_l],
+            [half_w, deck_offset - half_l],
+            [half_w, deck_offset + half_l],
+            [-half_w, deck_offset + half_l]])
+        self._last_pose = None
+
+    def update(self, pos, mow_power):
+        pose = pose_array(pos)[0]
+        if self._last_pose is not None and np.array_equal(pose, self._last_pose):
+            return 0
+        last = self._last_pose
+        self._last_pose = pose
+        if mow_power <= 0 or last is None:
+            return 0
+        corners = transform_points(np.vstack([self._deck, self._deck]), np.stack([last, pose]),
+            np.repeat([0, 1], len(self._deck)))
+        hull = cv2.convexHull(corners.astype(np.float32)).reshape(-1, 2)
+        return self._map.cover_polygon(hull)
+
+    def reset(self):
+        self._last_pose = None
+
+
+def merge_bounds(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def map_to_image(map_data, colors, out=None):
+    palette = colors if isinstance(colors, Palette) else Palette(colors)
+    return palette.colorize(map_data, out=out, normalized=True)
+
+
+class AdditiveFusion:
+    def __init__(self, dtype=np.float32):
+        self.dtype = dtype
+
+    def update(self, block, ys, xs, classes, weights):
+        np.add.at(block, (ys, xs, classes), weights.astype(self.dtype))
+
+
+class LogOddsFusion:
+    def __init__(self, p_hit=0.7, p_miss=0.4, limit=4, resolution=0.02):
+        self.dtype = np.int16
+        self._hit = math.log(p_hit / (1 - p_hit)) / resolution
+        self._miss = math.log(p_miss / (1 - p_miss)) / resolution
+        self._limit = min(int(limit / resolution), np.iinfo(self.dtype).max)
+
+    def update(self, block, ys, xs, classes, weights):
+        hits, uy, ux = cell_histogram(block.shape, ys, xs, classes, weights)
+        misses = hits.sum(axis=1, keepdims=True) - hits
+        delta = np.rint(hits * self._hit + misses * self._miss).astype(np.int32)
+        values = block[uy, ux].astype(np.int32) + delta
+        block[uy, ux] = np.clip(values, -self._limit, self._limit)
+
+
+class DecayFusion:
+    def __init__(self, decay=0.8, gain=64):
+        self.dtype = np.uint8
+        self._decay = decay
+        self._gain = gain
+
+    def update(self, block, ys, xs, classes, weights):
+        hits, uy, ux = cell_histogram(block.shape, ys, xs, classes, weights)
+        values = block[uy, ux] * np.float32(self._decay) + hits * self._gain
+        block[uy, ux] = np.rint(np.minimum(values, np.iinfo(self.dtype).max))
+
+
+def cell_histogram(shape, ys, xs, classes, weights):
+    height, width, num_classes = shape
+    cells, inverse = np.unique(ys * width + xs, return_inverse=True)
+    hits = np.zeros((len(cells), num_classes), dtype=np.float32)
+    np.add.at(hits, (inverse.reshape(-1), classes), weights)
+    return hits, cells // width, cells % width
 
 
 class Map:
@@ -116,16 +316,45 @@ class Map:
     TOP = 2
     BOTTOM = 3
 
-    def __init__(self, num_classes, size=10, scale=0.2):
+    GROW_EXACT = 0
+    GROW_DOUBLE = 1
+
+    def __init__(self, num_classes, size=10, scale=0.2, growth=GROW_EXACT, fusion=None):
         self._num_classes = num_classes
         self._scale = scale
+        self._growth = growth
+        self._fusion = AdditiveFusion() if fusion is None else fusion
 
         m_size = math.ceil(size / self._scale)
-        self._map = np.zeros((m_size, m_size, num_classes), dtype=np.float32)
+        self._buffer = np.zeros((m_size, m_size, num_classes), dtype=self._fusion.dtype)
+        self._offset = [0, 0]
+        self._map = self._buffer
         self._origin = [int(m_size / 2), int(m_size / 2)]
 
+        self._reallocations = 0
+        self._bytes_copied = 0
+
+        self._labels = None
+        self._labels_origin = None
+        self._dirty = None
+        self._changed = None
+
+    def get_growth_stats(self):
+        return {
+            'reallocations': self._reallocations,
+            'bytes_copied': self._bytes_copied,
+            'capacity': self._buffer.shape[:2],
+            'size': self._map.shape[:2]
+        }
+
     def extend_map(self, direction, units):
+        if self._growth == self.GROW_DOUBLE:
+            self._grow(direction, units)
+            return
+
         height, width = self._map.shape[:2]
+        self._reallocations += 1
+        self._bytes_copied += self._map.nbytes
 
         if direction == self.LEFT:
             self._map = np.column_stack([np.zeros((height, units, self._num_classes), dtype=self._map.dtype), self._map])
@@ -137,46 +366,480 @@ class Map:
             self._origin[1] += units
         elif direction == self.BOTTOM:
             self._map = np.vstack([self._map, np.zeros((units, width, self._num_classes), dtype=self._map.dtype)])
+        self._buffer = self._map
+
+    def _grow(self, direction, units):
+        height, width = self._map.shape[:2]
+        cap_h, cap_w = self._buffer.shape[:2]
+
+        if direction == self.LEFT:
+            if units > self._offset[0]:
+                self._reallocate(left=max(units - self._offset[0], cap_w))
+            self._offset[0] -= units
+            self._origin[0] += units
+            width += units
+        elif direction == self.RIGHT:
+            if self._offset[0] + width + units > cap_w:
+                self._reallocate(right=max(self._offset[0] + width + units - cap_w, cap_w))
+            width += units
+        elif direction == self.TOP:
+            if units > self._offset[1]:
+                self._reallocate(top=max(units - self._offset[1], cap_h))
+            self._offset[1] -= units
+            self._origin[1] += units
+            height += units
+        elif direction == self.BOTTOM:
+            if self._offset[1] + height + units > cap_h:
+                self._reallocate(bottom=max(self._offset[1] + height + units - cap_h, cap_h))
+            height += units
+
+        x, y = self._offset
+        self._map = self._buffer[y:y + height, x:x + width]
+
+    def _reallocate(self, left=0, right=0, top=0, bottom=0):
+        cap_h, cap_w = self._buffer.shape[:2]
+        height, width = self._map.shape[:2]
+        buffer = np.zeros((cap_h + top + bottom, cap_w + left + right, self._num_classes), dtype=self._buffer.dtype)
+        x = self._offset[0] + left
+        y = self._offset[1] + top
+        buffer[y:y + height, x:x + width] = self._map
+        self._buffer = buffer
+        self._offset = [x, y]
+        self._map = self._buffer[y:y + height, x:x + width]
+        self._reallocations += 1
+        self._bytes_copied += self._map.nbytes
 
     def get_data(self):
-        return np.argmax(self._map, axis=2)
+        self._refresh_labels()
+        return self._labels.copy()
+
+    def get_changed_region(self):
+        self._refresh_labels()
+        if self._changed is None:
+            return None
+        height, width = self._labels.shape
+        x0 = max(self._changed[0] + self._origin[0], 0)
+        y0 = max(self._changed[1] + self._origin[1], 0)
+        x1 = min(self._changed[2] + self._origin[0] + 1, width)
+        y1 = min(self._changed[3] + self._origin[1] + 1, height)
+        self._changed = None
+        return x0, y0, self._labels[y0:y1, x0:x1].copy()
 
     def get_origin(self):
         return self._origin
 
-    def map_projections(self, projections, default_extend=1):
-        for projection in projections:
-            height, width = self._map.shape[:2]
-            (x, y) = projection['pos']
-            cap_dist = distance([0, 0], projection['pos'])
+    def _refresh_labels(self):
+        height, width = self._map.shape[:2]
+        if self._labels is None or self._labels.shape != (height, width):
+            labels = np.zeros((height, width), dtype=np.int64)
+            if self._labels is not None:
+                h, w = self._labels.shape
+                x = self._origin[0] - self._labels_origin[0]
+                y = self._origin[1] - self._labels_origin[1]
+                labels[y:y + h, x:x + w] = self._labels
+            self._labels = labels
+            self._labels_origin = list(self._origin)
+        if self._dirty is not None:
+            x0 = self._dirty[0] + self._origin[0]
+            y0 = self._dirty[1] + self._origin[1]
+            x1 = self._dirty[2] + self._origin[0] + 1
+            y1 = self._dirty[3] + self._origin[1] + 1
+            self._labels[y0:y1, x0:x1] = np.argmax(self._map[y0:y1, x0:x1], axis=2)
+            self._dirty = None
+
+    def _mark_dirty(self, cells):
+        (x_min, y_min), (x_max, y_max) = cells.min(axis=0), cells.max(axis=0)
+        region = [int(x_min), int(y_min), int(x_max), int(y_max)]
+        self._dirty = merge_bounds(self._dirty, region)
+        self._changed = merge_bounds(self._changed, region)
+
+    def map_projections(self, projections, default_extend=1, weights=None):
+        classes, points = projections
+        if len(classes) == 0:
+            return
+        points = np.asarray(points, dtype=np.float64)
+        if weights is None:
+            weights = np.ones(len(classes), dtype=np.float32)
+
+        cells = map_cells(points, self._scale)
+        self._fit(cells, default_extend)
+        m_x = cells[:, 0] + self._origin[0]
+        m_y = cells[:, 1] + self._origin[1]
+        self._fusion.update(self._map, m_y, m_x, classes, np.asarray(weights, dtype=np.float32))
+        self._mark_dirty(cells)
+
+    def _fit(self, cells, default_extend):
+        height, width = self._map.shape[:2]
+        x_min, y_min = (int(v) for v in cells.min(axis=0) + self._origin)
+        x_max, y_max = (int(v) for v in cells.max(axis=0) + self._origin)
+        if x_min < 0:
+            self.extend_map(self.LEFT, max(-x_min, default_extend))
+        if x_max >= width:
+            self.extend_map(self.RIGHT, max(x_max + 1 - width, default_extend))
+        if y_min < 0:
+            self.extend_map(self.TOP, max(-y_min, default_extend))
+        if y_max >= height:
+            self.extend_map(self.BOTTOM, max(y_max + 1 - height, default_extend))
+
+
+class TiledMap:
+    HEADER = 'header.json'
+    TILE_FILE = re.compile(r'^tile_(-?\d+)_(-?\d+)\.bin$')
+    LABEL_FILE = 'labels_{}_{}.bin'
+
+    def __init__(self, num_classes, size=10, scale=0.2, tile_size=32, fusion=None,
+                 path=None, flush_interval=5, levels=3):
+        if tile_size % (1 << levels) != 0:
+            raise ValueError(f"Tile size {tile_size} is not divisible by {1 << levels}")
+        self._num_classes = num_classes
+        self._scale = scale
+        self._fusion = AdditiveFusion() if fusion is None else fusion
+        self._tile_size = tile_size
+        self._tiles = {}
+        self._bounds = None
+
+        self._version = 0
+        self._tile_versions = {}
+        self._labels = {}
+        self._dirty = set()
+        self._stale = set()
+        self._data = None
+        self._data_bounds = None
+        self._pyramid = [{} for _ in range(levels)]
+
+        self._coverage = {}
+        self._class_cells = np.zeros(num_classes, dtype=np.int64)
+        self._class_covered = np.zeros(num_classes, dtype=np.int64)
+
+        self._path = path
+        self._flush_interval = flush_interval
+        self._last_flush = time.perf_counter()
+        self._unflushed = set()
+        if path is not None:
+            self._open()
+
+        half = math.ceil(size / self._scale / 2)
+        self.get_tiles_in(-half, -half, half, half, allocate=True)
+        self.flush()
+
+    def get_scale(self):
+        return self._scale
+
+    def get_tile_size(self):
+        return self._tile_size
+
+    def get_tile(self, key, allocate=False):
+        tile = self._tiles.get(key)
+        if tile is None and allocate:
+            shape = (self._tile_size, self._tile_size, self._num_classes)
+            if self._path is None:
+                tile = np.zeros(shape, dtype=self._fusion.dtype)
+            else:
+                tile = np.memmap(self._tile_path(key), dtype=self._fusion.dtype, mode='w+', shape=shape)
+                self._unflushed.add(key)
+            self._version += 1
+            self._add_tile(key, tile, np.zeros((self._tile_size, self._tile_size), dtype=np.uint8))
+        return tile
+
+    def _add_tile(self, key, tile, labels):
+        t = self._tile_size
+        self._tiles[key] = tile
+        self._labels[key] = labels
+        for level, hists in enumerate(self._pyramid, 1):
+            f = 1 << level
+            hist = np.zeros((t // f, t // f, self._num_classes), dtype=np.int32)
+            hist[:, :, 0] = f * f
+            hists[key] = hist
+        self._coverage[key] = np.zeros((t, t), dtype=np.uint8)
+        self._class_cells[0] += t * t
+        self._tile_versions[key] = self._version
+        self._stale.add(key)
+        region = [key[0] * t, key[1] * t, (key[0] + 1) * t, (key[1] + 1) * t]
+        self._bounds = merge_bounds(self._bounds, region)
+
+    def _tile_path(self, key):
+        return os.path.join(self._path, f"tile_{key[0]}_{key[1]}.bin")
+
+    def _label_path(self, key):
+        return os.path.join(self._path, self.LABEL_FILE.format(*key))
+
+    def _tile_labels(self, key):
+        labels = self._labels[key]
+        if labels is None:
+            t = self._tile_size
+            path = self._label_path(key)
+            if os.path.isfile(path) and os.path.getsize(path) == t * t:
+                labels = np.fromfile(path, dtype=np.uint8).reshape(t, t)
+            else:
+                labels = np.argmax(self._tiles[key], axis=2).astype(np.uint8)
+                self._unflushed.add(key)
+            self._update_pyramid(key, np.zeros((t, t), dtype=np.uint8), labels)
+            self._labels[key] = labels
+        return labels
+
+    def _load_labels(self):
+        for key, labels in self._labels.items():
+            if labels is None:
+                self._tile_labels(key)
+
+    def _header(self):
+        return {
+            'num_classes': self._num_classes,
+            'scale': self._scale,
+            'tile_size': self._tile_size,
+            'dtype': np.dtype(self._fusion.dtype).str,
+            'version': self._version
+        }
+
+    def _open(self):
+        os.makedirs(self._path, exist_ok=True)
+        header_path = os.path.join(self._path, self.HEADER)
+        if not os.path.isfile(header_path):
+            return
+        with open(header_path, 'r') as file:
+            header = json.load(file)
+        expected = self._header()
+        for field in ('num_classes', 'scale', 'tile_size', 'dtype'):
+            if header[field] != expected[field]:
+                raise ValueError(f"Map at \"{self._path}\" has {field} {header[field]}, expected {expected[field]}")
+        self._version = header['version']
+
+        shape = (self._tile_size, self._tile_size, self._num_classes)
+        for name in os.listdir(self._path):
+            match = self.TILE_FILE.match(name)
+            if match is None:
+                continue
+            key = (int(match.group(1)), int(match.group(2)))
+            tile = np.memmap(os.path.join(self._path, name), dtype=self._fusion.dtype, mode='r+', shape=shape)
+            self._add_tile(key, tile, None)
+
+    def flush(self):
+        if self._path is None:
+            return
+        self._refresh_labels()
+        for key in self._unflushed:
+            self._tiles[key].flush()
+            if self._labels[key] is not None:
+                self._labels[key].tofile(self._label_path(key))
+        self._unflushed.clear()
+        header_path = os.path.join(self._path, self.HEADER)
+        with open(header_path + '.tmp', 'w') as file:
+            json.dump(self._header(), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(header_path + '.tmp', header_path)
+        self._last_flush = time.perf_counter()
+
+    def close(self):
+        self.flush()
+
+    def get_tiles_in(self, x_min, y_min, x_max, y_max, allocate=False):
+        t = self._tile_size
+        tiles = {}
+        for ty in range(y_min // t, y_max // t + 1):
+            for tx in range(x_min // t, x_max // t + 1):
+                tile = self.get_tile((tx, ty), allocate)
+                if tile is not None:
+                    tiles[(tx, ty)] = tile
+        return tiles
+
+    def get_keys(self):
+        return list(self._tiles.keys())
+
+    def get_bounds(self):
+        if self._bounds is None:
+            return None
+        return tuple(self._bounds)
+
+    def get_version(self):
+        return self._version
+
+    def get_data(self):
+        self._refresh_labels()
+        bounds = self.get_bounds()
+        if bounds is None:
+            return np.zeros((0, 0), dtype=np.uint8)
+        x_min, y_min, x_max, y_max = bounds
+        if bounds != self._data_bounds:
+            self._data = np.zeros((y_max - y_min, x_max - x_min), dtype=np.uint8)
+            self._data_bounds = bounds
+            self._stale = set(self._labels.keys())
+        t = self._tile_size
+        for (tx, ty) in self._stale:
+            y = ty * t - y_min
+            x = tx * t - x_min
+            self._data[y:y + t, x:x + t] = self._tile_labels((tx, ty))
+        self._stale.clear()
+        return self._data.copy()
+
+    def get_labels(self, key):
+        self._refresh_labels()
+        if key not in self._labels:
+            return None
+        return self._tile_labels(key)
+
+    def get_changes(self, since=None):
+        self._refresh_labels()
+        if since is None:
+            return self._version, {key: self._tile_labels(key) for key in self._labels}
+        changes = {key: self._tile_labels(key) for key, version in self._tile_versions.items() if version > since}
+        return self._version, changes
+
+    def get_levels(self):
+        return len(self._pyramid)
+
+    def get_histogram(self, level):
+        self._refresh_labels()
+        self._load_labels()
+        bounds = self.get_bounds()
+        if level == 0 or bounds is None:
+            raise ValueError(f"No histogram at level {level}")
+        f = 1 << level
+        t = self._tile_size // f
+        x_min, y_min, x_max, y_max = (b // f for b in bounds)
+        histogram = np.zeros((y_max - y_min, x_max - x_min, self._num_classes), dtype=np.int32)
+        for (tx, ty), hist in self._pyramid[level - 1].items():
+            y = ty * t - y_min
+            x = tx * t - x_min
+            histogram[y:y + t, x:x + t] = hist
+        return histogram
+
+    def get_level_data(self, level):
+        if level == 0:
+            return self.get_data()
+        return np.argmax(self.get_histogram(level), axis=2)
+
+    def get_level_origin(self, level):
+        return [o >> level for o in self.get_origin()]
+
+    def select_level(self, max_width, max_height):
+        bounds = self.get_bounds()
+        if bounds is None:
+            return 0
+        width = bounds[2] - bounds[0]
+        height = bounds[3] - bounds[1]
+        for level in range(len(self._pyramid) + 1):
+            if width >> level <= max_width and height >> level <= max_height:
+                return level
+        return len(self._pyramid)
+
+    def _refresh_labels(self):
+        for key in self._dirty:
+            labels = np.argmax(self._tiles[key], axis=2).astype(np.uint8)
+            self._update_pyramid(key, self._tile_labels(key), labels)
+            self._labels[key] = labels
+        self._stale |= self._dirty
+        self._dirty.clear()
+
+    def _update_pyramid(self, key, old, new):
+        ys, xs = np.nonzero(old != new)
+        if len(ys) == 0:
+            return
+        old = old[ys, xs]
+        new = new[ys, xs]
+        for level, hists in enumerate(self._pyramid, 1):
+            hist = hists[key]
+            np.subtract.at(hist, (ys >> level, xs >> level, old), 1)
+            np.add.at(hist, (ys >> level, xs >> level, new), 1)
+        self._class_cells += np.bincount(new, minlength=self._num_classes)
+        self._class_cells -= np.bincount(old, minlength=self._num_classes)
+        covered = self._coverage[key][ys, xs] != 0
+        self._class_covered += np.bincount(new[covered], minlength=self._num_classes)
+        self._class_covered -= np.bincount(old[covered], minlength=self._num_classes)
+
+    def cover_polygon(self, polygon):
+        polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2) / self._scale
+        polygon[:, 1] *= -1
+        cells = fill_convex(polygon)
+        if len(cells) == 0:
+            return 0
+        self._refresh_labels()
+        keys = cells // self._tile_size
+        local = cells - keys * self._tile_size
+        tile_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        count = 0
+        for i, (tx, ty) in enumerate(tile_keys):
+            sel = inverse == i
+            key = (int(tx), int(ty))
+            self.get_tile(key, allocate=True)
+            ys, xs = local[sel, 1], local[sel, 0]
+            coverage = self._coverage[key]
+            new = coverage[ys, xs] == 0
+            ys, xs = ys[new], xs[new]
+            coverage[ys, xs] = 1
+            self._class_covered += np.bincount(self._tile_labels(key)[ys, xs], minlength=self._num_classes)
+            count += len(ys)
+        return count
+
+    def get_coverage(self):
+        self._refresh_labels()
+        self._load_labels()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            coverage = 100 * self._class_covered / self._class_cells
+        return np.nan_to_num(coverage)
+
+    def get_coverage_data(self):
+        bounds = self.get_bounds()
+        if bounds is None:
+            return np.zeros((0, 0), dtype=np.uint8)
+        x_min, y_min, x_max, y_max = bounds
+        t = self._tile_size
+        data = np.zeros((y_max - y_min, x_max - x_min), dtype=np.uint8)
+        for (tx, ty), coverage in self._coverage.items():
+            y = ty * t - y_min
+            x = tx * t - x_min
+            data[y:y + t, x:x + t] = coverage
+        return data
+
+    def get_origin(self):
+        bounds = self.get_bounds()
+        if bounds is None:
+            return [0, 0]
+        return [-bounds[0], -bounds[1]]
+
+    def map_projections(self, projections, weights=None):
+        classes, points = projections
+        if len(classes) == 0:
+            return
+        classes = np.asarray(classes)
+        points = np.asarray(points, dtype=np.float64)
+        if weights is None:
+            weights = np.ones(len(classes), dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
 
-            m_x = round(x / self._scale) + self._origin[0]
-            m_y = -round(y / self._scale) + self._origin[1]
-            if m_x < 0:
-                self.extend_map(self.LEFT, max(abs(m_x), default_extend))
-            elif m_x >= width:
-                self.extend_map(self.RIGHT, max(m_x + 1 - width, default_extend))
-            if m_y < 0:
-                self.extend_map(self.TOP, max(abs(m_y), default_extend))
-            elif m_y >= height:
-                self.extend_map(self.BOTTOM, max(m_y + 1 - height, default_extend))
-            m_x = round(x / self._scale) + self._origin[0]
-            m_y = -round(y / self._scale) + self._origin[1]
+        self._version += 1
+        cells = map_cells(points, self._scale)
+        keys = cells // self._tile_size
+        local = cells - keys * self._tile_size
+        tile_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for i, (tx, ty) in enumerate(tile_keys):
+            sel = inverse == i
+            key = (int(tx), int(ty))
+            tile = self.get_tile(key, allocate=True)
+            self._fusion.update(tile, local[sel, 1], local[sel, 0], classes[sel], weights[sel])
+            self._tile_versions[key] = self._version
+            self._dirty.add(key)
+            if self._path is not None:
+                self._unflushed.add(key)
 
-            self._map[m_y, m_x, projection['class']] += math.exp(-cap_dist)
+        if self._path is not None and time.perf_counter() - self._last_flush >= self._flush_interval:
+            self.flush()
 
 
 if __name__ == '__main__':
-    import time
     map = Map(4, size=5, scale=1)
-    projections = [{'class': 1, 'pos': (i, i)} for i in range(10)]
-    print(map.get_map())
+    points = np.array([(i, i) for i in range(10)], dtype=np.float64)
+    projections = (np.full(len(points), 1), points)
+    print(map.get_data())
 
     map.map_projections(projections)
 
-    projections = [{'class': 3, 'pos': (i, i)} for i in range(9*17)]
+    points = np.array([(i, i) for i in range(9*17)], dtype=np.float64)
+    projections = (np.full(len(points), 3), points)
     start = time.time()
     map.map_projections(projections)
     map.map_projections(projections)
     print(time.time() - start)
-    print(map.get_map())
+    print(map.get_data())
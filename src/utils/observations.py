@@ -0,0 +1,112 @@
+import time
+import numpy as np
+
+
+KEY_OFFSET = 1 << 20
+
+
+def cell_keys(ix, iy):
+    return ((ix + KEY_OFFSET) << 21) | (iy + KEY_OFFSET)
+
+
+class ObservationStore:
+    def __init__(self, capacity=50000, max_age=5, cell_size=0.5):
+        self._capacity = capacity
+        self._max_age = max_age
+        self._cell_size = cell_size
+
+        self._x = np.zeros(capacity, dtype=np.float32)
+        self._y = np.zeros(capacity, dtype=np.float32)
+        self._cls = np.zeros(capacity, dtype=np.int16)
+        self._t = np.full(capacity, -np.inf, dtype=np.float64)
+        self._w = np.zeros(capacity, dtype=np.float32)
+        self._head = 0
+        self._size = 0
+
+        self._order = None
+        self._keys = None
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._t[:] = -np.inf
+        self._head = 0
+        self._size = 0
+        self._order = None
+
+    def add(self, projections, t=None, weights=None):
+        classes, points = projections
+        n = len(classes)
+        if n == 0:
+            return
+        if t is None:
+            t = time.perf_counter()
+        if weights is None:
+            weights = 1
+        if n > self._capacity:
+            classes = classes[-self._capacity:]
+            points = points[-self._capacity:]
+            if np.ndim(weights) != 0:
+                weights = weights[-self._capacity:]
+            n = self._capacity
+
+        index = (self._head + np.arange(n)) % self._capacity
+        self._x[index] = points[:, 0]
+        self._y[index] = points[:, 1]
+        self._cls[index] = classes
+        self._t[index] = t
+        self._w[index] = weights
+        self._head = (self._head + n) % self._capacity
+        self._size = min(self._size + n, self._capacity)
+        self._order = None
+
+    def query(self, center, radius, max_age=None, classes=None, now=None):
+        if hasattr(center, 'heading'):
+            center = (center.x, center.y)
+        if now is None:
+            now = time.perf_counter()
+        if max_age is None:
+            max_age = self._max_age
+        self._index()
+
+        c = self._cell_size
+        x0, x1 = int(np.floor((center[0] - radius) / c)), int(np.floor((center[0] + radius) / c))
+        y0, y1 = int(np.floor((center[1] - radius) / c)), int(np.floor((center[1] + radius) / c))
+        ix, iy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+        keys = cell_keys(ix.ravel(), iy.ravel())
+        lo = np.searchsorted(self._keys, keys, side='left')
+        hi = np.searchsorted(self._keys, keys, side='right')
+        if len(lo) == 0 or np.all(lo == hi):
+            return self._select(np.zeros(0, dtype=np.int64))
+        index = np.concatenate([self._order[a:b] for a, b in zip(lo, hi) if a != b])
+
+        dx = self._x[index] - center[0]
+        dy = self._y[index] - center[1]
+        keep = (dx * dx + dy * dy <= radius * radius) & (self._t[index] >= now - max_age)
+        if classes is not None:
+            keep &= np.isin(self._cls[index], classes)
+        return self._select(index[keep])
+
+    def count(self, center, radius, max_age=None, classes=None, now=None):
+        return len(self.query(center, radius, max_age, classes, now)['cls'])
+
+    def _select(self, index):
+        return {
+            'x': self._x[index],
+            'y': self._y[index],
+            'cls': self._cls[index],
+            't': self._t[index],
+            'w': self._w[index]
+        }
+
+    def _index(self):
+        if self._order is not None:
+            return
+        live = np.flatnonzero(np.isfinite(self._t))
+        ix = np.floor(self._x[live] / self._cell_size).astype(np.int64)
+        iy = np.floor(self._y[live] / self._cell_size).astype(np.int64)
+        keys = cell_keys(ix, iy)
+        order = np.argsort(keys, kind='stable')
+        self._order = live[order]
+        self._keys = keys[order]
@@ -0,0 +1,332 @@
+import heapq
+import math
+import numpy as np
+
+
+CLASS_COSTS = {'grass': 1, 'ground': 2, 'void': 5, 'background': math.inf}
+SQRT2 = math.sqrt(2)
+
+
+def class_costs(classes, costs=CLASS_COSTS, default=5):
+    return np.array([costs.get(c, default) for c in classes], dtype=np.float32)
+
+
+class CostGrid:
+    def __init__(self, map, costs):
+        self._map = map
+        self._costs = np.asarray(costs, dtype=np.float32)
+        self._version = None
+        self._bounds = None
+        self._grid = None
+        self._list = None
+
+    def update(self):
+        version, tiles = self._map.get_changes(self._version)
+        self._version = version
+        bounds = self._map.get_bounds()
+        if bounds != self._bounds:
+            self._bounds = bounds
+            labels = self._map.get_data()
+            self._grid = np.full((labels.shape[0] + 2, labels.shape[1] + 2), np.inf, dtype=np.float32)
+            self._grid[1:-1, 1:-1] = self._costs[labels]
+            self._list = None
+            return None
+        t = self._map.get_tile_size()
+        for (tx, ty), labels in tiles.items():
+            y = ty * t - bounds[1] + 1
+            x = tx * t - bounds[0] + 1
+            self._grid[y:y + t, x:x + t] = self._costs[labels]
+        if len(tiles) != 0:
+            self._list = None
+        return set(tiles.keys())
+
+    def get_grid(self):
+        return self._grid[1:-1, 1:-1]
+
+    def get_padded(self):
+        return self._grid
+
+    def get_list(self):
+        if self._list is None:
+            self._list = self._grid.ravel().tolist()
+        return self._list
+
+    def get_min_cost(self):
+        return float(np.min(self._costs))
+
+    def width(self):
+        return self._grid.shape[1]
+
+    def to_index(self, point):
+        scale = self._map.get_scale()
+        x = int(round(point[0] / scale)) - self._bounds[0] + 1
+        y = -int(round(point[1] / scale)) - self._bounds[1] + 1
+        if not (0 < y < self._grid.shape[0] - 1 and 0 < x < self._grid.shape[1] - 1):
+            return None
+        return y * self._grid.shape[1] + x
+
+    def to_points(self, index):
+        scale = self._map.get_scale()
+        y, x = np.divmod(np.asarray(index, dtype=np.int64), self._grid.shape[1])
+        px = (x - 1 + self._bounds[0]) * scale
+        py = -(y - 1 + self._bounds[1]) * scale
+        return np.stack([px, py], axis=1)
+
+    def to_key(self, index):
+        t = self._map.get_tile_size()
+        y, x = divmod(index, self._grid.shape[1])
+        return ((x - 1 + self._bounds[0]) // t, (y - 1 + self._bounds[1]) // t)
+
+
+def astar(costs, width, start, goal, min_cost=1, weight=1):
+    w = width
+    neighbors = [(-w, 1), (w, 1), (-1, 1), (1, 1),
+                 (-w - 1, SQRT2), (-w + 1, SQRT2), (w - 1, SQRT2), (w + 1, SQRT2)]
+    goal_y, goal_x = divmod(goal, w)
+    min_cost *= weight
+    diag = (SQRT2 - 2) * min_cost
+
+    g = [math.inf] * len(costs)
+    parent = [-1] * len(costs)
+    closed = bytearray(len(costs))
+    g[start] = 0
+    heap = [(0, start)]
+    while heap:
+        _, node = heapq.heappop(heap)
+        if closed[node]:
+            continue
+        if node == goal:
+            break
+        closed[node] = 1
+        g_node = g[node]
+        for offset, step in neighbors:
+            n = node + offset
+            cost = costs[n]
+            if closed[n] or cost == math.inf:
+                continue
+            g_n = g_node + step * cost
+            if g_n < g[n]:
+                g[n] = g_n
+                parent[n] = node
+                ny, nx = divmod(n, w)
+                dy = abs(ny - goal_y)
+                dx = abs(nx - goal_x)
+                h = min_cost * (dx + dy) + diag * min(dx, dy)
+                heapq.heappush(heap, (g_n + h, n))
+
+    if goal != start and parent[goal] == -1:
+        return None
+    path = [goal]
+    while path[-1] != start:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+
+def block_costs(grid, factor):
+    height, width = grid.shape
+    h, w = -(-height // factor), -(-width // factor)
+    padded = np.full((h * factor, w * factor), np.inf, dtype=np.float32)
+    padded[:height, :width] = grid
+    blocks = np.full((h + 2, w + 2), np.inf, dtype=np.float32)
+    blocks[1:-1, 1:-1] = padded.reshape(h, factor, w, factor).min(axis=(1, 3))
+    return blocks
+
+
+def corridor_mask(blocks, path, factor, shape, radius=1):
+    mask = np.zeros(blocks.shape, dtype=bool)
+    mask.flat[path] = True
+    grown = mask.copy()
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            grown |= np.roll(np.roll(mask, dy, axis=0), dx, axis=1)
+    grown = grown[1:-1, 1:-1].repeat(factor, axis=0).repeat(factor, axis=1)
+    return grown[:shape[0], :shape[1]]
+
+
+def simplify_path(path):
+    if len(path) < 3:
+        return list(path)
+    path = np.asarray(path, dtype=np.int64)
+    steps = np.diff(path)
+    turns = np.flatnonzero(steps[1:] != steps[:-1]) + 1
+    return path[np.concatenate([[0], turns, [len(path) - 1]])].tolist()
+
+
+class GridPlanner:
+    def __init__(self, map, costs, factor=8, radius=1, weight=1):
+        self._grid = CostGrid(map, costs)
+        self._factor = factor
+        self._radius = radius
+        self._weight = weight
+        self._path = None
+        self._path_keys = set()
+        self._goal = None
+
+    def get_cost_grid(self):
+        return self._grid
+
+    def plan(self, start, goal):
+        if hasattr(start, 'heading'):
+            start = (start.x, start.y)
+        changed = self._grid.update()
+        start = self._grid.to_index(start)
+        goal = self._grid.to_index(goal)
+        if start is None or goal is None:
+            self._path = None
+            return None
+
+        path = self._reuse(start, goal, changed)
+        if path is None:
+            path = self._search(start, goal)
+        self._path = path
+        self._goal = goal
+        if path is None:
+            self._path_keys = set()
+            return None
+        self._path_keys = set(self._grid.to_key(i) for i in path)
+        return self._grid.to_points(simplify_path(path))
+
+    def _search(self, start, goal):
+        width = self._grid.width()
+        min_cost = self._grid.get_min_cost()
+        if self._factor > 1:
+            f = self._factor
+            grid = self._grid.get_padded()
+            blocks = block_costs(grid, f)
+            bw = blocks.shape[1]
+            (sy, sx), (gy, gx) = divmod(start, width), divmod(goal, width)
+            coarse = astar(blocks.ravel().tolist(), bw, (sy // f + 1) * bw + sx // f + 1,
+                           (gy // f + 1) * bw + gx // f + 1, min_cost)
+            if coarse is not None:
+                mask = corridor_mask(blocks, coarse, f, grid.shape, self._radius)
+                local = np.where(mask, grid, np.inf)
+                path = astar(local.ravel().tolist(), width, start, goal, min_cost, self._weight)
+                if path is not None:
+                    return path
+        return astar(self._grid.get_list(), width, start, goal, min_cost, self._weight)
+
+    def _reuse(self, start, goal, changed):
+        if self._path is None or goal != self._goal or changed is None:
+            return None
+        if not changed.isdisjoint(self._path_keys):
+            return None
+        try:
+            return self._path[self._path.index(start):]
+        except ValueError as e:
+            return None
+
+
+def row_segments(mask, min_length=1):
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = ends - starts + 1 >= min_length
+    return np.stack([starts[keep], ends[keep]], axis=1)
+
+
+class CoveragePlanner:
+    def __init__(self, map, mow_class=1, swath=0.5, min_length=2):
+        self._map = map
+        self._mow_class = mow_class
+        self._min_length = min_length
+        self._step = max(1, int(round(swath / map.get_scale())))
+
+        self._version = None
+        self._bounds = None
+        self._rows = {}
+
+    def update(self):
+        version, tiles = self._map.get_changes(self._version)
+        self._version = version
+        bounds = self._map.get_bounds()
+        if bounds is None:
+            self._rows = {}
+            return
+        if bounds != self._bounds:
+            self._bounds = bounds
+            self._rows = {}
+            rows = range(-(-bounds[1] // self._step), (bounds[3] - 1) // self._step + 1)
+        else:
+            t = self._map.get_tile_size()
+            rows = set()
+            for (tx, ty) in tiles.keys():
+                rows.update(range(-(-ty * t // self._step), (ty * t + t - 1) // self._step + 1))
+        if len(rows) == 0:
+            return
+        labels = self._map.get_data()
+        x_min, y_min = bounds[:2]
+        for k in rows:
+            mask = labels[k * self._step - y_min] == self._mow_class
+            segments = row_segments(mask, self._min_length)
+            if len(segments) == 0:
+                self._rows.pop(k, None)
+            else:
+                self._rows[k] = segments + x_min
+
+    def decompose(self):
+        cells = []
+        previous = []
+        last_k = None
+        for k in sorted(self._rows.keys()):
+            current = []
+            for x0, x1 in self._rows[k]:
+                overlaps = [i for i, (p0, p1, _) in enumerate(previous) if p0 <= x1 and x0 <= p1]
+                cell = None
+                if last_k == k - 1 and len(overlaps) == 1:
+                    p0, p1, cell = previous[overlaps[0]]
+                    others = [s for s in self._rows[k] if s[0] <= p1 and p0 <= s[1]]
+                    if len(others) != 1:
+                        cell = None
+                if cell is None:
+                    cell = len(cells)
+                    cells.append([])
+                cells[cell].append((k, int(x0), int(x1)))
+                current.append((x0, x1, cell))
+            previous = current
+            last_k = k
+        return cells
+
+    def plan(self, start, router=None):
+        if hasattr(start, 'heading'):
+            start = (start.x, start.y)
+        self.update()
+        scale = self._map.get_scale()
+        cells = self.decompose()
+        position = np.array(start, dtype=np.float64)
+        waypoints = [position]
+        remaining = list(range(len(cells)))
+        while remaining:
+            best = None
+            for c in remaining:
+                for stripes in self._entries(cells[c]):
+                    entry = self._to_point(stripes[0][0], stripes[0][1], scale)
+                    dist = math.hypot(*(entry - position))
+                    if best is None or dist < best[0]:
+                        best = (dist, c, stripes)
+            _, c, stripes = best
+            remaining.remove(c)
+            entry = self._to_point(stripes[0][0], stripes[0][1], scale)
+            if router is not None:
+                route = router.plan(position, entry)
+                if route is not None:
+                    waypoints.extend(route[1:-1])
+            for k, x_from, x_to in stripes:
+                waypoints.append(self._to_point(k, x_from, scale))
+                waypoints.append(self._to_point(k, x_to, scale))
+            position = waypoints[-1]
+        return np.array(waypoints).reshape(-1, 2)[1:]
+
+    def _entries(self, cell):
+        for order in (cell, cell[::-1]):
+            for left_first in (True, False):
+                stripes = []
+                for i, (k, x0, x1) in enumerate(order):
+                    if (i % 2 == 0) == left_first:
+                        stripes.append((k, x0, x1))
+                    else:
+                        stripes.append((k, x1, x0))
+                yield stripes
+
+    def _to_point(self, k, x, scale):
+        return np.array([x * scale, -k * self._step * scale])
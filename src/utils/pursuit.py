@@ -0,0 +1,172 @@
+import math
+import time
+import threading
+import numpy as np
+
+from helpfuncs import differential_power
+
+
+class TimingStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._total = 0
+        self._max = 0
+
+    def add(self, value):
+        self._count += 1
+        self._total += value
+        self._max = max(self._max, value)
+
+    def mean(self):
+        if self._count == 0:
+            return 0
+        return self._total / self._count
+
+    def max(self):
+        return self._max
+
+
+class PurePursuit:
+    def __init__(self, controller, lookahead=0.6, speed=0.5, mow_power=0,
+                 track_width=0.5, goal_tolerance=0.2, rate=50):
+        self._controller = controller
+        self._lookahead = lookahead
+        self._speed = speed
+        self._mow_power = mow_power
+        self._track_width = track_width
+        self._goal_tolerance = goal_tolerance
+        self._period = 1 / rate
+
+        self._waypoints = None
+        self._index = 0
+        self._done = True
+
+        self._cycles = 0
+        self._missed = 0
+        self._jitter = TimingStats()
+        self._latency = TimingStats()
+
+        self._running = False
+        self._update_thread = None
+        self._lock = threading.Lock()
+
+    def set_path(self, waypoints):
+        with self._lock:
+            self._waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+            self._index = 0
+            self._done = len(self._waypoints) == 0
+
+    def is_done(self):
+        return self._done
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._update_thread = threading.Thread(target=self._update)
+            self._update_thread.start()
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            self._update_thread.join()
+            self._controller.set_motor_speed(0, 0, 0)
+
+    def is_running(self):
+        return self._running
+
+    def get_stats(self):
+        return {
+            'cycles': self._cycles,
+            'missed': self._missed,
+            'jitter_mean': self._jitter.mean(),
+            'jitter_max': self._jitter.max(),
+            'latency_mean': self._latency.mean(),
+            'latency_max': self._latency.max()
+        }
+
+    def reset_stats(self):
+        self._cycles = 0
+        self._missed = 0
+        self._jitter.reset()
+        self._latency.reset()
+
+    def compute(self, x, y, heading):
+        with self._lock:
+            if self._done:
+                return 0, 0
+            position = np.array([x, y])
+            if math.hypot(*(self._waypoints[-1] - position)) <= self._goal_tolerance:
+                self._done = True
+                return 0, 0
+            target = self._target(position)
+
+        theta = math.radians(heading + 90)
+        dx, dy = target - position
+        ahead = dx * math.cos(theta) + dy * math.sin(theta)
+        lateral = -dx * math.sin(theta) + dy * math.cos(theta)
+        dist_sq = max(dx * dx + dy * dy, 1e-9)
+        curvature = 2 * lateral / dist_sq
+        forward = self._speed if ahead >= 0 else 0
+        steer = -curvature * self._track_width / 2 * max(forward, self._speed / 2)
+        return forward, steer
+
+    def _target(self, position):
+        points = self._waypoints[self._index:]
+        if len(points) < 2:
+            return self._waypoints[-1]
+        start = points[:-1]
+        seg = points[1:] - start
+        seg_len = np.hypot(seg[:, 0], seg[:, 1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip(np.sum((position - start) * seg, axis=1) / seg_len ** 2, 0, 1)
+        t = np.nan_to_num(t)
+        closest = start + seg * t[:, None]
+        j = int(np.argmin(np.hypot(*(closest - position).T)))
+        self._index += j
+
+        remaining = np.concatenate([[(1 - t[j]) * seg_len[j]], seg_len[j + 1:]])
+        travelled = np.cumsum(remaining)
+        k = int(np.searchsorted(travelled, self._lookahead))
+        if k >= len(remaining):
+            return points[-1]
+        if k == 0:
+            base = closest[j]
+            length = remaining[0]
+            end = points[j + 1]
+            along = self._lookahead
+        else:
+            base = points[j + k]
+            length = remaining[k]
+            end = points[j + k + 1]
+            along = self._lookahead - travelled[k - 1]
+        if length == 0:
+            return end
+        return base + (end - base) * (along / length)
+
+    def _update(self):
+        deadline = time.perf_counter() + self._period
+        while self._running:
+            wait = deadline - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            wake = time.perf_counter()
+            self._jitter.add(wake - deadline)
+
+            pos = self._controller.pos
+            forward, steer = self.compute(pos.x, pos.y, pos.heading.get())
+            if self._done:
+                self._controller.set_motor_speed(0, 0, 0)
+            else:
+                left_pow, right_pow = differential_power(forward, steer)
+                self._controller.set_motor_speed(left_pow, right_pow, self._mow_power)
+
+            done = time.perf_counter()
+            self._latency.add(done - wake)
+            self._cycles += 1
+            deadline += self._period
+            if deadline < done:
+                self._missed += 1
+                deadline = done + self._period
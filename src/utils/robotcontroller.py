@@ -160,6 +160,7 @@ class RobotController:
 
         self._gps = GPSData()
         self._motors = MotorData()
+        self._motor_limit = 1
         self._imu = IMUData()
         self.pos = Position()
         self._plog = PositionLogger()
@@ -193,6 +194,15 @@ class RobotController:
         if -1 <= mow_power <= 1:
             self._motors.mow_power = mow_power
 
+    def get_motors(self):
+        return self._motors
+
+    def set_motor_limit(self, limit):
+        self._motor_limit = min(max(limit, 0), 1)
+
+    def get_motor_limit(self):
+        return self._motor_limit
+
     def reset_position(self):
         self.pos.x = 0
         self.pos.y = 0
@@ -202,6 +212,7 @@ class RobotController:
         motor_send_rate = Rate(30)
         pos_update_rate = Rate(30)
         last_pos = None
+        last_limit = self._motor_limit
         while self._running:
             start = main_rate.get_start()
             if self._startup:
@@ -272,10 +283,12 @@ class RobotController:
                 except (ValueError, IndexError) as e:
                     pass
 
-            if motor_send_rate.ready():
-                lp = int(self._motors.left_power * 1000)
-                rp = int(self._motors.right_power * 1000)
-                mp = int(self._motors.mow_power * 1000)
+            if motor_send_rate.ready() or self._motor_limit != last_limit:
+                limit = self._motor_limit
+                last_limit = limit
+                lp = int(self._motors.left_power * limit * 1000)
+                rp = int(self._motors.right_power * limit * 1000)
+                mp = int(self._motors.mow_power * 1000) if limit != 0 else 0
                 str = f"$JETSON,{lp},{rp},{mp},\n\r"
                 try:
                     self._port.write(str.encode('utf-8'))
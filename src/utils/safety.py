@@ -0,0 +1,73 @@
+import time
+import numpy as np
+
+
+class SafetyGate:
+    def __init__(self, lut, classes, danger=('background',), width=0.6,
+                 stop_depth=None, slow_depth=None, stop_fraction=0.5, slow_limit=0.4,
+                 min_cells=1, timeout=0.5):
+        self._lut = lut
+        self._danger = np.array([c in danger for c in classes], dtype=bool)
+        self._width = width
+        self._stop_depth = stop_depth
+        self._slow_depth = slow_depth
+        self._stop_fraction = stop_fraction
+        self._slow_limit = slow_limit
+        self._min_cells = min_cells
+        self._timeout = timeout
+
+        self._limit = 0
+        self._last_check = None
+        self._stop_count = 0
+        self._slow_count = 0
+        self.update_zones()
+
+    def update_zones(self):
+        near, far = self.get_footprint()
+        stop_depth = self._stop_depth
+        if stop_depth is None:
+            stop_depth = near + (far - near) * self._stop_fraction
+        slow_depth = far if self._slow_depth is None else self._slow_depth
+
+        stop = self._lut.get_zone(self._width, stop_depth)
+        slow = self._lut.get_zone(self._width, slow_depth, min_depth=stop_depth) & ~stop
+        self._stop_index = np.flatnonzero(stop)
+        self._slow_index = np.flatnonzero(slow)
+        if len(self._stop_index) == 0:
+            raise ValueError(f"Stop zone is empty (depth {stop_depth:.2f} m, footprint {near:.2f}-{far:.2f} m)")
+        if len(self._slow_index) == 0:
+            self._print(f"Slow zone is empty (depth {stop_depth:.2f}-{slow_depth:.2f} m, footprint {near:.2f}-{far:.2f} m)")
+        return stop_depth, slow_depth
+
+    def get_footprint(self):
+        band = self._lut.get_zone(self._width, np.inf, min_depth=-np.inf)
+        depth = self._lut.get_offsets()[..., 1][band]
+        if len(depth) == 0:
+            raise ValueError("No projected cells ahead of the mower")
+        return float(depth.min()), float(depth.max())
+
+    def check(self, inference):
+        danger = self._danger[np.take(inference, self._stop_index).astype(np.intp)]
+        self._stop_count = int(np.count_nonzero(danger))
+        danger = self._danger[np.take(inference, self._slow_index).astype(np.intp)]
+        self._slow_count = int(np.count_nonzero(danger))
+
+        if self._stop_count >= self._min_cells:
+            self._limit = 0
+        elif self._slow_count >= self._min_cells:
+            self._limit = self._slow_limit
+        else:
+            self._limit = 1
+        self._last_check = time.perf_counter()
+        return self._limit
+
+    def get_limit(self):
+        if self._last_check is None or time.perf_counter() - self._last_check > self._timeout:
+            return 0
+        return self._limit
+
+    def get_counts(self):
+        return self._stop_count, self._slow_count
+
+    def _print(self, msg):
+        print(f"[SAFETY] {msg}")
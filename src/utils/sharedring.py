@@ -0,0 +1,48 @@
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+
+class SharedRing:
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        self._slots = slots
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._owner = name is None
+
+        size = max(1, slots * int(np.prod(self._shape)) * self._dtype.itemsize)
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            try:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+            except (KeyError, AttributeError) as e:
+                pass
+        self._array = np.ndarray((slots,) + self._shape, dtype=self._dtype, buffer=self._shm.buf)
+        self._next = 0
+
+    def __reduce__(self):
+        return (SharedRing, (self._slots, self._shape, self._dtype, self._shm.name))
+
+    def __len__(self):
+        return self._slots
+
+    def get_name(self):
+        return self._shm.name
+
+    def write(self, data):
+        slot = self._next
+        self._array[slot] = data
+        self._next = (slot + 1) % self._slots
+        return slot
+
+    def get(self, slot):
+        return self._array[slot]
+
+    def close(self):
+        if self._array is None:
+            return
+        self._array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()